@@ -1,21 +1,17 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
-from streamlit_extras.card import card
 from streamlit_extras.metric_cards import style_metric_cards
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import json
-import plotly
-import plotly.io as pio
-from plotly.colors import n_colors
-import io
-import base64
 from io import BytesIO
-from openpyxl import Workbook
-from statsmodels.tsa.seasonal import seasonal_decompose
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+
+from utils import (read_file, compute_missing_summary, compute_dtype_partitions,
+                   compute_fill_candidates, column_uniques, isin_mask,
+                   fast_corr, fast_group_agg)
+
+# plotly 系列在用到它们的页面函数内部再导入，冷启动时不为
+# 未访问的页面付出上百毫秒的导入成本
 
 # 设置页面配置
 st.set_page_config(layout="wide", page_title="数据分析工具", page_icon="📊")
@@ -27,32 +23,34 @@ def local_css(file_name):
 
 local_css("style.css")
 
-# 读取文件函数
-def read_file(file):
-    try:
-        file_extension = file.name.split('.')[-1].lower()
-        if file_extension == 'csv':
-            data = pd.read_csv(file)
-        elif file_extension in ['xlsx', 'xls']:
-            data = pd.read_excel(file)
-        elif file_extension == 'json':
-            data = pd.read_json(file)
-        else:
-            st.error(f"不支持的文件格式：{file_extension}")
-            return None
-        
-        # 自动检测并转换日期时间列
-        for col in data.columns:
-            if data[col].dtype == 'object':
-                try:
-                    data[col] = pd.to_datetime(data[col])
-                except:
-                    pass
-        
-        return data
-    except Exception as e:
-        st.error(f"读取文件时出错：{str(e)}")
-        return None
+# 超大散点图改走 datashader 栅格化：逐点成本在几十纳秒级，点数不再受
+# 前端渲染上限约束；未安装 datashader 时退回步长抽样的普通散点图
+def render_scatter(data, x, y, color, color_scheme):
+    import plotly.express as px
+    import plotly.graph_objects as go
+    if len(data) > 50_000:
+        try:
+            import datashader as ds
+            import datashader.transfer_functions as tf
+        except ImportError:
+            ds = None
+        if ds is not None:
+            canvas = ds.Canvas(plot_width=800, plot_height=600)
+            if color is not None and isinstance(data[color].dtype, pd.CategoricalDtype):
+                agg = canvas.points(data, x, y, ds.count_cat(color))
+            else:
+                agg = canvas.points(data, x, y, ds.count())
+            img = tf.shade(agg, how='eq_hist')
+            fig = go.Figure(go.Image(z=np.asarray(img.to_pil())))
+            # 栅格图的像素坐标与原始数值无直接对应，隐藏刻度避免误读
+            fig.update_xaxes(showticklabels=False)
+            fig.update_yaxes(showticklabels=False)
+            return fig
+        data = data.iloc[::len(data) // 20_000]
+    # 超过 5 千点换 WebGL 轨迹，交给浏览器 GPU 绘制，SVG 在这个量级就会卡顿
+    return px.scatter(data, x=x, y=y, color=color,
+                      render_mode='webgl' if len(data) > 5_000 else 'svg',
+                      color_discrete_sequence=color_scheme)
 
 # 主函数
 def main():
@@ -97,7 +95,8 @@ def data_overview():
             with col2:
                 st.metric("列数", data.shape[1])
             with col3:
-                st.metric("缺失值数", data.isnull().sum().sum())
+                n_missing, _ = compute_missing_summary(data)
+                st.metric("缺失值数", n_missing)
             
             style_metric_cards()
             
@@ -107,21 +106,28 @@ def data_overview():
             st.subheader("数据类型")
             st.dataframe(data.dtypes)
             
-            # 数据导出
+            # 数据导出：序列化只在点击"生成"时做一次，结果放进 session_state，
+            # 之后的重跑直接复用字节，原先的 base64 data-URI 方案每次重跑
+            # 都要重新编码并放大约 1/3 体积
             st.subheader("数据导出")
             export_format = st.radio("选择导出格式", ["CSV", "Excel"])
-            if st.button("导出数据"):
+            if st.button("生成导出文件"):
                 if export_format == "CSV":
-                    csv = data.to_csv(index=False)
-                    b64 = base64.b64encode(csv.encode()).decode()
-                    href = f'<a href="data:file/csv;base64,{b64}" download="exported_data.csv">下载 CSV 文件</a>'
+                    st.session_state['export_payload'] = (
+                        data.to_csv(index=False).encode(), "exported_data.csv", "text/csv")
                 else:
                     towrite = BytesIO()
-                    data.to_excel(towrite, index=False, engine="openpyxl")
-                    towrite.seek(0)
-                    b64 = base64.b64encode(towrite.read()).decode()
-                    href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="exported_data.xlsx">下载 Excel 文件</a>'
-                st.markdown(href, unsafe_allow_html=True)
+                    # 不能开 constant_memory：to_excel 按列写单元格，而该模式
+                    # 会在触及后续行时立刻落盘，回头写已落盘的行会被静默丢弃
+                    with pd.ExcelWriter(towrite, engine='xlsxwriter',
+                                        engine_kwargs={'options': {'strings_to_urls': False}}) as writer:
+                        data.to_excel(writer, index=False)
+                    st.session_state['export_payload'] = (
+                        towrite.getvalue(), "exported_data.xlsx",
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            if 'export_payload' in st.session_state:
+                payload, file_name, mime = st.session_state['export_payload']
+                st.download_button("下载文件", data=payload, file_name=file_name, mime=mime)
 
 # 数据清洗函数
 def data_cleaning():
@@ -138,18 +144,42 @@ def data_cleaning():
         data = data.drop_duplicates()
         st.success(f"删除了 {original_rows - data.shape[0]} 行重复数据")
     
+    st.subheader("数据筛选")
+    filter_columns = st.multiselect("选择筛选列", list(data.columns))
+    for column in filter_columns:
+        uniques = column_uniques(data, column)
+        if len(uniques) >= 10_000:
+            # 高基数列不枚举唯一值，改用文本匹配
+            pattern = st.text_input(f"筛选 {column}（包含文本，支持正则）")
+            if pattern:
+                try:
+                    mask = data[column].astype(str).str.contains(pattern, na=False)
+                except Exception:
+                    # 输入到一半的正则（如未闭合的括号）不应让整个页面崩掉
+                    st.warning(f"无效的筛选表达式：{pattern}")
+                else:
+                    data = data[mask]
+        else:
+            selected_values = st.multiselect(f"选择 {column} 的值", uniques)
+            if selected_values:
+                data = data[isin_mask(data[column], selected_values)]
+
     st.subheader("处理缺失值")
-    missing_columns = data.columns[data.isnull().any()].tolist()
+    _, missing_columns = compute_missing_summary(data)
+    fills = compute_fill_candidates(data, missing_columns)
+    fill_map = {}
+    drop_columns = []
     for column in missing_columns:
         method = st.selectbox(f"选择处理 {column} 缺失值的方法", ["保持不变", "删除", "填充平均值", "填充中位数", "填充众数"])
         if method == "删除":
-            data = data.dropna(subset=[column])
-        elif method == "填充平均值":
-            data[column].fillna(data[column].mean(), inplace=True)
-        elif method == "填充中位数":
-            data[column].fillna(data[column].median(), inplace=True)
-        elif method == "填充众数":
-            data[column].fillna(data[column].mode()[0], inplace=True)
+            drop_columns.append(column)
+        elif method in fills[column]:
+            fill_map[column] = fills[column][method]
+    # 汇总后一次性填充/删除，整表只扫一遍而不是每列一遍
+    if fill_map:
+        data = data.fillna(fill_map)
+    if drop_columns:
+        data = data.dropna(subset=drop_columns)
     
     st.session_state['data'] = data
     st.success("数据清洗完成")
@@ -163,6 +193,7 @@ def data_cleaning():
 
 # 数据分析函数
 def data_analysis():
+    import plotly.express as px
     st.title("数据分析")
     if 'data' not in st.session_state:
         st.warning("请先在数据概览页面上传数据")
@@ -174,17 +205,22 @@ def data_analysis():
     st.dataframe(data.describe())
     
     st.subheader("相关性分析")
-    numeric_columns = data.select_dtypes(include=['float64', 'int64']).columns
+    numeric_columns, _ = compute_dtype_partitions(data)
     if len(numeric_columns) < 2:
         st.warning("数据集中数值列不足两列，无法进行相关性分析。")
     else:
-        corr_matrix = data[numeric_columns].corr()
+        corr_matrix = fast_corr(data[numeric_columns])
         fig = px.imshow(corr_matrix, text_auto=True, aspect="auto", color_continuous_scale='RdBu_r', zmin=-1, zmax=1, labels=dict(color="相关系数"))
         fig.update_traces(text=corr_matrix.round(2), texttemplate="%{text}")
         st.plotly_chart(fig, use_container_width=True)
 
 # 数据可视化函数
 def data_visualization():
+    import plotly
+    import plotly.express as px
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    from plotly.colors import n_colors
     st.title("数据可视化")
     if 'data' not in st.session_state:
         st.warning("请先在数据概览页面上传数据")
@@ -197,9 +233,8 @@ def data_visualization():
     
     chart_type = st.selectbox("选择图表类型", ["散点图", "线图", "柱状图", "箱线图", "直方图", "饼图", "热力图"])
     
-    numeric_columns = data.select_dtypes(include=['float64', 'int64']).columns
-    categorical_columns = data.select_dtypes(include=['object']).columns
-    
+    numeric_columns, categorical_columns = compute_dtype_partitions(data)
+
     if len(numeric_columns) == 0:
         st.warning("数据集中没有数值列，无法进行可视化。")
         return
@@ -216,14 +251,22 @@ def data_visualization():
         y_column = st.selectbox("选择Y轴", numeric_columns)
         color_column = st.selectbox("选择颜色列（可选）", ["无"] + list(categorical_columns))
         
+        plot_data = data
         if chart_type == "散点图":
-            fig = px.scatter(data, x=x_column, y=y_column, color=color_column if color_column != "无" else None,
-                             color_discrete_sequence=color_scheme)
+            fig = render_scatter(plot_data, x_column, y_column,
+                                 color_column if color_column != "无" else None, color_scheme)
         elif chart_type == "线图":
-            fig = px.line(data, x=x_column, y=y_column, color=color_column if color_column != "无" else None,
+            if len(plot_data) > 50_000:
+                plot_data = plot_data.iloc[::len(plot_data) // 20_000]
+            fig = px.line(plot_data, x=x_column, y=y_column, color=color_column if color_column != "无" else None,
+                          render_mode='webgl' if len(plot_data) > 5_000 else 'svg',
                           color_discrete_sequence=color_scheme)
         else:  # 柱状图
-            fig = px.bar(data, x=x_column, y=y_column, color=color_column if color_column != "无" else None,
+            # 大表先在服务端按 X(和颜色列)分组取均值，只把聚合结果交给前端
+            if len(plot_data) > 20_000:
+                group_keys = [x_column] if color_column == "无" else [x_column, color_column]
+                plot_data = plot_data.groupby(group_keys, observed=True)[y_column].mean().reset_index()
+            fig = px.bar(plot_data, x=x_column, y=y_column, color=color_column if color_column != "无" else None,
                          color_discrete_sequence=color_scheme)
     
     elif chart_type in ["箱线图", "直方图"]:
@@ -231,25 +274,34 @@ def data_visualization():
         if chart_type == "箱线图":
             fig = px.box(data, y=column, color_discrete_sequence=color_scheme)
         else:  # 直方图
-            fig = px.histogram(data, x=column, nbins=30, marginal="box", 
-                               color_discrete_sequence=color_scheme)
-            fig.update_traces(opacity=0.75)
-            fig.update_layout(bargap=0.1)
+            if len(data) > 20_000:
+                # 大表在服务端先分箱，前端只收到 100 根柱子而不是整列原始值
+                counts, edges = np.histogram(data[column].dropna().to_numpy(dtype='float64'), bins=100)
+                centers = (edges[:-1] + edges[1:]) / 2
+                fig = px.bar(x=centers, y=counts, color_discrete_sequence=color_scheme)
+                fig.update_layout(bargap=0.1)
+            else:
+                fig = px.histogram(data, x=column, nbins=30, marginal="box",
+                                   color_discrete_sequence=color_scheme)
+                fig.update_traces(opacity=0.75)
+                fig.update_layout(bargap=0.1)
     
     elif chart_type == "饼图":
         if len(categorical_columns) == 0:
             st.warning("数据集中没有分类列，无法创建饼图。")
             return
         column = st.selectbox("选择列", categorical_columns)
-        value_counts = data[column].value_counts()
-        fig = px.pie(values=value_counts.values, names=value_counts.index, title=f'{column} 的分布',
+        # 一次 value_counts 归约出小表，饼图轨迹只含 nunique 行
+        vc = data[column].value_counts().reset_index()
+        vc.columns = [column, 'count']
+        fig = px.pie(vc, names=column, values='count', title=f'{column} 的分布',
                      color_discrete_sequence=color_scheme)
     
     elif chart_type == "热力图":
         if len(numeric_columns) < 2:
             st.warning("数据集中数值列不足两列，无法创建热力图。")
             return
-        corr_matrix = data[numeric_columns].corr()
+        corr_matrix = fast_corr(data[numeric_columns])
         fig = px.imshow(corr_matrix, 
                         text_auto=True, 
                         aspect="auto", 
@@ -294,13 +346,10 @@ def data_visualization():
     fig_large = go.Figure(fig)
     fig_large.update_layout(width=1200, height=800)
     
-    # 将Plotly图表转换为JSON
+    # 将Plotly图表转换为JSON，直接交给原生下载按钮，省去 base64 编码
     fig_json = json.dumps(fig_large, cls=plotly.utils.PlotlyJSONEncoder)
-    
-    # 创建下载链接
-    b64 = base64.b64encode(fig_json.encode()).decode()
-    href = f'<a href="data:application/json;base64,{b64}" download="chart.json">下载图表数据 (JSON格式)</a>'
-    st.markdown(href, unsafe_allow_html=True)
+    st.download_button("下载图表数据 (JSON格式)", data=fig_json,
+                       file_name="chart.json", mime="application/json")
     
     # 添加说明
     st.markdown("""
@@ -310,6 +359,7 @@ def data_visualization():
 
 # 高级分析函数
 def advanced_analysis():
+    import plotly.express as px
     st.title("高级分析")
     if 'data' not in st.session_state:
         st.warning("请先在数据概览页面上传数据")
@@ -319,11 +369,12 @@ def advanced_analysis():
     
     st.subheader("数据分组和聚合")
     group_column = st.selectbox("选择分组列", data.columns)
-    agg_column = st.selectbox("选择聚合列", data.select_dtypes(include=['float64', 'int64']).columns)
+    numeric_columns, _ = compute_dtype_partitions(data)
+    agg_column = st.selectbox("选择聚合列", numeric_columns)
     agg_function = st.selectbox("选择聚合函数", ["平均值", "总和", "最大值", "最小值"])
     
     agg_dict = {"平均值": "mean", "总和": "sum", "最大值": "max", "最小值": "min"}
-    grouped_data = data.groupby(group_column)[agg_column].agg(agg_dict[agg_function]).reset_index()
+    grouped_data = fast_group_agg(data, group_column, agg_column, agg_dict[agg_function])
     
     st.write("分组聚合结果：")
     st.dataframe(grouped_data)
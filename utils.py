@@ -0,0 +1,193 @@
+# 数据层共享工具：文件读取、缓存扫描和各类向量化加速函数，
+# 供 app.py 的各页面函数复用
+import streamlit as st
+import numpy as np
+import pandas as pd
+import io
+import hashlib
+import os
+import tempfile
+
+# 按文件名和内容缓存解析结果，组件交互触发的重跑直接命中缓存，无需重新解析
+@st.cache_data(max_entries=8, show_spinner=False)
+def _parse_bytes(name, raw):
+    file_extension = name.split('.')[-1].lower()
+    if file_extension == 'csv':
+        data = None
+        try:
+            # 优先走 polars 的多线程 Rust 读取器，大文件上比 pandas 快数倍；
+            # 读完立即桥接回 pandas，下游代码不感知
+            import polars as pl
+            data = pl.read_csv(io.BytesIO(raw), try_parse_dates=True).to_pandas()
+        except Exception:
+            data = None
+        if data is None:
+            try:
+                # pyarrow 引擎多线程解析，宽表场景下比默认 C 引擎快数倍
+                data = pd.read_csv(io.BytesIO(raw), encoding='utf-8',
+                                   engine='pyarrow', dtype_backend='pyarrow')
+            except (UnicodeDecodeError, ValueError):
+                # 中文环境常见的 GBK/GB18030 编码回退；pyarrow 不支持该编码，
+                # 先转码成 UTF-8 再走默认引擎
+                raw_utf8 = raw.decode('gb18030').encode('utf-8')
+                data = pd.read_csv(io.BytesIO(raw_utf8))
+    elif file_extension in ['xlsx', 'xls']:
+        data = pd.read_excel(io.BytesIO(raw))
+    else:  # json
+        data = pd.read_json(io.BytesIO(raw))
+
+    # 自动检测并转换日期时间列（Arrow 字符串列的 kind 是 'U'，不是 'O'）
+    for col in data.columns:
+        if data[col].dtype.kind in 'OU':
+            try:
+                data[col] = pd.to_datetime(data[col])
+            except:
+                pass
+
+    return post_load_optimize(data)
+
+# 加载后自动压缩列类型：数值列向下转换、低基数文本列转 category，
+# 减少内存占用和后续统计、绘图需要搬运的字节数
+def post_load_optimize(data):
+    for col in data.columns:
+        kind = getattr(data[col].dtype, 'kind', '')
+        if kind == 'f':
+            data[col] = pd.to_numeric(data[col], downcast='float')
+        elif kind in 'iu':
+            data[col] = pd.to_numeric(data[col], downcast='integer')
+        elif kind in 'OU' and data[col].nunique() / max(len(data), 1) < 0.5:
+            data[col] = data[col].astype('category')
+    return data
+
+# Feather 缓存的读取同样挂在 st.cache_data 下（路径里带内容哈希）：
+# 热重跑仍是字典查找，磁盘反序列化只在内存缓存未命中时发生
+@st.cache_data(max_entries=8, show_spinner=False)
+def _load_feather(cache_path):
+    return pd.read_feather(cache_path)
+
+# 读取文件函数
+def read_file(file):
+    try:
+        file_extension = file.name.split('.')[-1].lower()
+        if file_extension not in ['csv', 'xlsx', 'xls', 'json']:
+            st.error(f"不支持的文件格式：{file_extension}")
+            return None
+        # 只取一次字节内容，按内容哈希在磁盘上维护 Feather 缓存：
+        # 内存缓存被淘汰或进程重启后，同一份上传直接从 Arrow 文件载入，
+        # 开销与原始文件大小无关
+        raw = file.getvalue()
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        cache_path = os.path.join(tempfile.gettempdir(), f"cdvt_{digest}.feather")
+        if st.session_state.get('upload_hash') != digest:
+            st.session_state['upload_hash'] = digest
+            # 换了新文件，清掉上一份数据遗留的导出缓存，
+            # 避免下载按钮继续提供旧文件的字节
+            st.session_state.pop('export_payload', None)
+        if os.path.exists(cache_path):
+            return _load_feather(cache_path)
+        data = _parse_bytes(file.name, raw)
+        try:
+            data.to_feather(cache_path)
+        except Exception:
+            # 个别列类型（如混合 object）无法序列化为 Feather 时只跳过落盘
+            pass
+        return data
+    except Exception as e:
+        st.error(f"读取文件时出错：{str(e)}")
+        return None
+
+# DataFrame 级扫描结果缓存：以 (身份, 形状, 列类型) 作为缓存键，
+# 避免每次组件交互触发的重跑都重新全表扫描
+_DF_HASH = {pd.DataFrame: lambda d: (id(d), d.shape, tuple(str(t) for t in d.dtypes))}
+
+@st.cache_data(hash_funcs=_DF_HASH, max_entries=16, show_spinner=False)
+def compute_missing_summary(data):
+    null_counts = data.isnull().sum()
+    return int(null_counts.sum()), null_counts.index[null_counts > 0].tolist()
+
+# 直接按 dtype.kind 一趟扫完列类型，O(列数)，不像 select_dtypes 那样
+# 构造过滤后的 DataFrame 视图，也能覆盖降采样得到的 float32/int32 和 Arrow 类型
+def numeric_cols(data):
+    return data.columns[[getattr(dt, 'kind', '') in 'iufc' for dt in data.dtypes]]
+
+def categorical_cols(data):
+    return data.columns[[isinstance(dt, pd.CategoricalDtype) or getattr(dt, 'kind', '') in 'OUb'
+                         for dt in data.dtypes]]
+
+@st.cache_data(hash_funcs=_DF_HASH, max_entries=16, show_spinner=False)
+def compute_dtype_partitions(data):
+    return numeric_cols(data), categorical_cols(data)
+
+# 缺失列的候选填充值：数值列用一次 agg 批量算出均值/中位数，众数逐列取，
+# 结果按 DataFrame 缓存，选择框触发的重跑直接查表而不重新统计
+@st.cache_data(hash_funcs=_DF_HASH, max_entries=16, show_spinner=False)
+def compute_fill_candidates(data, missing_columns):
+    numeric_missing = [c for c in missing_columns if getattr(data[c].dtype, 'kind', '') in 'iuf']
+    stats = data[numeric_missing].agg(['mean', 'median']) if numeric_missing else None
+    fills = {}
+    for column in missing_columns:
+        mode = data[column].mode()
+        fills[column] = {"填充众数": mode.iat[0] if len(mode) else None}
+        if column in numeric_missing:
+            fills[column]["填充平均值"] = stats.at['mean', column]
+            fills[column]["填充中位数"] = stats.at['median', column]
+    return fills
+
+# 列唯一值缓存：每个 (DataFrame, 列) 只做一次全列哈希扫描填充下拉框；
+# category 列直接读 .cat.categories，无需扫描。超过 1 万个唯一值时截断，
+# 由调用方改用文本筛选
+@st.cache_data(hash_funcs=_DF_HASH, max_entries=32, show_spinner=False)
+def column_uniques(data, column):
+    s = data[column]
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.categories.tolist()
+    return pd.unique(s.dropna().to_numpy())[:10_000].tolist()
+
+# isin 筛选掩码：category 列直接在整数编码上比较，数值列在底层 ndarray
+# 上用 np.isin，都走 numpy 的 C 内核而不是对每行做 Python 哈希
+def isin_mask(s, selected_values):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cats = s.cat.categories
+        selected_codes = np.array([cats.get_loc(v) for v in selected_values], dtype=np.int32)
+        return np.isin(s.cat.codes.to_numpy(), selected_codes)
+    if getattr(s.dtype, 'kind', '') in 'iuf':
+        return np.isin(s.to_numpy(), np.asarray(selected_values))
+    return s.isin(selected_values).to_numpy()
+
+# 相关性矩阵：转成 float32 连续数组后用 np.corrcoef，相比
+# DataFrame.corr() 少搬一半字节并走 BLAS 单精度内核；np.corrcoef 会让
+# NaN 传染整行整列，含缺失值时退回 pandas 的成对完整观测算法
+@st.cache_data(hash_funcs=_DF_HASH, max_entries=16, show_spinner=False)
+def fast_corr(df_num):
+    arr = df_num.to_numpy(dtype=np.float32, copy=False)
+    if np.isnan(arr).any():
+        return df_num.corr()
+    corr = np.corrcoef(np.ascontiguousarray(arr.T))
+    return pd.DataFrame(corr, index=df_num.columns, columns=df_num.columns)
+
+# 分组聚合：先把分组列因子化成整数编码并缓存在会话里（同一列反复换聚合
+# 函数时直接复用），求和/平均走 np.bincount 的 C 内核，免去每次聚合都
+# 重建 pandas 哈希表；最大/最小仍用 pandas 的 Cython 内核
+def fast_group_agg(data, group_column, agg_column, how):
+    if how not in ('sum', 'mean'):
+        return data.groupby(group_column, observed=True)[agg_column].agg(how).reset_index()
+
+    # sort=True 让分组顺序与 max/min 分支的 pandas groupby 一致，切换聚合
+    # 函数时结果不再重排；会话里只保留最近一份因子化结果，不随数据版本
+    # 累积 O(行数) 的编码数组
+    cache_key = (id(data), group_column)
+    cached = st.session_state.get('group_factorize')
+    if cached is None or cached[0] != cache_key:
+        cached = (cache_key, pd.factorize(data[group_column], sort=True))
+        st.session_state['group_factorize'] = cached
+    codes, uniques = cached[1]
+
+    vals = data[agg_column].to_numpy(dtype='float64')
+    mask = (codes >= 0) & ~np.isnan(vals)  # factorize 将缺失值编码为 -1
+    sums = np.bincount(codes[mask], weights=vals[mask], minlength=len(uniques))
+    if how == 'mean':
+        counts = np.bincount(codes[mask], minlength=len(uniques))
+        out = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    else:
+        out = sums
+    return pd.DataFrame({group_column: uniques, agg_column: out})